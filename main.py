@@ -12,6 +12,11 @@ try:
 except ImportError:
     stage_elaboration = None
 
+try:
+    import stage_fold
+except ImportError:
+    stage_fold = None
+
 try:
     import stage_bitblast
 except ImportError:
@@ -27,6 +32,8 @@ def main():
     parser = argparse.ArgumentParser(description="Python Logic Synthesizer (PyLogSyn)")
     parser.add_argument("input_file", help="Path to the Verilog input file (.v)")
     parser.add_argument("--output", "-o", default="out.blif", help="Path to the output BLIF file")
+    parser.add_argument("--adder", default="kogge-stone", choices=["kogge-stone", "sparse4"],
+                        help="Carry network used when bit-blasting ADD")
     
     args = parser.parse_args()
     
@@ -61,21 +68,31 @@ def main():
         sys.exit(0)
 
     # ---------------------------------------------------------
-    # Step 3: Bit Blasting
+    # Step 3: Constant Folding & Dead-Gate Elimination
+    # ---------------------------------------------------------
+    if stage_fold:
+        print("\n[Step 3] Constant Folding...")
+        # Simplifies the high-level Module in-place before it is expanded to bits
+        stage_fold.run(my_module)
+    else:
+        print("Warning: stage_fold not found. Skipping optimization.")
+
+    # ---------------------------------------------------------
+    # Step 4: Bit Blasting
     # ---------------------------------------------------------
     if stage_bitblast:
-        print("\n[Step 3] Bit Blasting...")
+        print("\n[Step 4] Bit Blasting...")
         # Takes the high-level Module, modifies it in-place to be gate-level
-        stage_bitblast.run(my_module)
+        stage_bitblast.run(my_module, adder=args.adder)
     else:
         print("Warning: stage_bitblast not implemented yet. Stopping.")
         sys.exit(0)
 
     # ---------------------------------------------------------
-    # Step 4: Export
+    # Step 5: Export
     # ---------------------------------------------------------
     if stage_export:
-        print(f"\n[Step 4] Exporting to {args.output}...")
+        print(f"\n[Step 5] Exporting to {args.output}...")
         stage_export.run(my_module, args.output)
     else:
         print("Warning: stage_export not implemented yet. Stopping.")
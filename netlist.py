@@ -1,5 +1,22 @@
 # netlist.py
 import json
+import os
+import sys
+from array import array
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def debug_enabled():
+    """Intermediate JSON dumps are only written when ACFLS_DEBUG is set."""
+    return bool(os.environ.get("ACFLS_DEBUG"))
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
 
 class Signal:
     """
@@ -11,7 +28,7 @@ class Signal:
         self.is_input = is_input
         self.is_output = is_output
         self.is_reg = is_reg
-        self.id = id(self)  # Unique ID for hashing/graphing
+        self.id = None  # Dense integer ID, assigned by Module.add_signal
 
     def __repr__(self):
         # Easier debugging representation
@@ -31,12 +48,33 @@ class Signal:
             }
         }
 
+def const_value(sig):
+    """
+    Value of a constant signal, or None if sig is not one.
+    Elaboration names constants CONST_<value>_<width>b. The value is truncated
+    to the signal's (the literal's declared) width; readers zero-extend it.
+    """
+    if not sig.name.startswith("CONST_"):
+        return None
+    try:
+        return int(sig.name.split('_')[1]) & ((1 << sig.width) - 1)
+    except (IndexError, ValueError):
+        return None
+
+# Gate op codes for the column (struct-of-arrays) gate storage in Module.
+# High-level ops come first, primitives after; new ops are appended.
+OPS = ("ADD", "EQ", "DFF_EN_RST", "AND", "OR", "XOR", "NOT", "BUF", "MUX", "DFF", "XNOR")
+OP_CODE = {op: code for code, op in enumerate(OPS)}
+
 class Gate:
     """
     Represents a logic operation.
     Before Bit-Blasting, this can be high-level (e.g., OP="ADD").
     After Bit-Blasting, this is strictly low-level (e.g., OP="AND", OP="DFF").
+    Module stores gates as columns; Gate objects are only built at the API boundary.
     """
+    __slots__ = ("op_type", "inputs", "output")
+
     def __init__(self, op_type, inputs, output):
         self.op_type = op_type   # e.g., "AND", "OR", "NOT", "ADD", "MUX", "DFF"
         self.inputs = inputs     # List of Signal objects
@@ -54,23 +92,138 @@ class Gate:
             "output": self.output.name
         }
 
+class GateList:
+    """
+    Sequence of Gate views over a Module's gate columns.
+    Gates can be appended (forwarded to Module.add_gate), but views cannot be
+    modified in place: assign a new list to Module.gates instead.
+    """
+    __slots__ = ("_mod",)
+
+    def __init__(self, mod):
+        self._mod = mod
+
+    def append(self, gate):
+        self._mod.add_gate(gate)
+
+    def __len__(self):
+        return len(self._mod.gate_op)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            view = self._mod.gate_view
+            return [view(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("gate index out of range")
+        return self._mod.gate_view(i)
+
+    def __iter__(self):
+        view = self._mod.gate_view
+        for i in range(len(self)):
+            yield view(i)
+
 class Module:
     """
     The container for the entire design.
     """
     def __init__(self, name):
         self.name = name
-        self.signals = {}  # Dict mapping name -> Signal object
-        self.gates = []    # List of Gate objects
+        self.signals = {}      # Dict mapping name -> Signal object
+        self.signal_list = []  # Signal.id -> Signal object
+        self.name_to_idx = {}  # Dict mapping name -> Signal.id
+        self._tmp_counter = 0  # Suffix for generated signal names
+        self._clear_gates()
+
+    def _clear_gates(self):
+        # Gates are stored as parallel columns, one row per gate, holding the
+        # op code and signal indices. Unused input slots are -1; inputs beyond
+        # the third (only DFF_EN_RST has them) go to gate_more_inputs.
+        self.gate_op = array('B')
+        self.gate_in0 = array('i')
+        self.gate_in1 = array('i')
+        self.gate_in2 = array('i')
+        self.gate_out = array('i')
+        self.gate_more_inputs = {}  # Dict mapping gate row -> list of extra input indices
 
     def add_signal(self, signal):
+        """Registers the signal and assigns its id (stable, dense, in insertion order)."""
+        idx = self.name_to_idx.get(signal.name)
+        if idx is None:
+            idx = len(self.signal_list)
+            self.name_to_idx[signal.name] = idx
+            self.signal_list.append(signal)
+        else:
+            # Same name re-added: the new object takes over the old id
+            self.signal_list[idx] = signal
+        signal.id = idx
         self.signals[signal.name] = signal
 
+    def add_signals(self, signals):
+        """Bulk add_signal for freshly created signals (names not yet in the module)."""
+        idx = len(self.signal_list)
+        for s in signals:
+            s.id = idx
+            self.name_to_idx[s.name] = idx
+            self.signal_list.append(s)
+            self.signals[s.name] = s
+            idx += 1
+
     def get_signal(self, name):
         return self.signals.get(name)
 
+    def fresh_name(self, prefix):
+        """Unique, interned name "<prefix>_<n>" for a generated signal."""
+        name = sys.intern(f"{prefix}_{self._tmp_counter}")
+        self._tmp_counter += 1
+        return name
+
+    def signal_index(self, signal):
+        """Signal.id within this module, registering the signal if it is new."""
+        idx = signal.id
+        if idx is not None and idx < len(self.signal_list) and self.signal_list[idx] is signal:
+            return idx
+        idx = self.name_to_idx.get(signal.name)
+        if idx is None:
+            self.add_signal(signal)
+            idx = self.name_to_idx[signal.name]
+        return idx
+
     def add_gate(self, gate):
-        self.gates.append(gate)
+        code = OP_CODE.get(gate.op_type)
+        if code is None:
+            raise ValueError(f"Netlist: unknown gate type '{gate.op_type}'")
+        idx = self.signal_index
+        ins = [idx(s) for s in gate.inputs]
+        if len(ins) > 3:
+            self.gate_more_inputs[len(self.gate_op)] = ins[3:]
+        ins += [-1, -1, -1]
+        self.gate_op.append(code)
+        self.gate_in0.append(ins[0])
+        self.gate_in1.append(ins[1])
+        self.gate_in2.append(ins[2])
+        self.gate_out.append(idx(gate.output))
+
+    def gate_view(self, i):
+        """Builds the Gate object for gate row i."""
+        sigs = self.signal_list
+        ins = [sigs[j] for j in (self.gate_in0[i], self.gate_in1[i], self.gate_in2[i]) if j >= 0]
+        ins += [sigs[j] for j in self.gate_more_inputs.get(i, ())]
+        return Gate(OPS[self.gate_op[i]], ins, sigs[self.gate_out[i]])
+
+    @property
+    def gates(self):
+        """Gate objects, as a read-only view over the gate columns."""
+        return GateList(self)
+
+    @gates.setter
+    def gates(self, gates):
+        # Materialize first: gates may be (a generator over) this module's own view
+        gates = list(gates)
+        self._clear_gates()
+        for g in gates:
+            self.add_gate(g)
 
     def to_json(self):
         """Dumps the entire netlist to a JSON-compatible dictionary"""
@@ -81,6 +234,22 @@ class Module:
         }
 
     def save_json(self, filename):
-        with open(filename, 'w') as f:
-            json.dump(self.to_json(), f, indent=4)
-        print(f"Saved intermediate netlist to {filename}")
\ No newline at end of file
+        """
+        Streams the netlist to a JSON file, one signal/gate object per line,
+        without building the combined to_json() dict first.
+        """
+        with open(filename, 'wb') as f:
+            f.write(b'{\n  "module_name": ' + _dumps(self.name) + b',\n')
+            _write_json_array(f, "signals", (s.to_dict() for s in self.signals.values()))
+            f.write(b',\n')
+            _write_json_array(f, "gates", (g.to_dict() for g in self.gates))
+            f.write(b'\n}\n')
+        print(f"Saved intermediate netlist to {filename}")
+
+def _write_json_array(f, key, objs):
+    f.write(b'  ' + _dumps(key) + b': [')
+    sep = b'\n    '
+    for obj in objs:
+        f.write(sep + _dumps(obj))
+        sep = b',\n    '
+    f.write(b'\n  ]')
\ No newline at end of file
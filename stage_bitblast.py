@@ -2,13 +2,13 @@
 # Bit-blasting: convert high-level gates (ADD, EQ, MUX, AND/OR) into 1-bit primitives.
 # Supports:
 # - Expand buses into bit signals: <name>_<i> (LSB=0)
-# - ADD -> ripple-carry
-# - EQ -> XNOR tree + AND reduction
+# - ADD -> Kogge-Stone prefix adder; chains of ADDs are fused into a carry-save compressor tree
+# - EQ -> XNOR per bit + AND reduction
+# - ADD/EQ only span the operands' effective width (bits that can be non-zero)
 # - MUX (wide) -> Array of 1-bit MUXes
 # - Bitwise Ops -> Array of 1-bit gates
 
-import re
-from netlist import Signal, Gate
+from netlist import Signal, OPS, OP_CODE, const_value, debug_enabled
 
 # ---------- helpers: naming ----------
 def bit_name(base: str, i: int) -> str:
@@ -17,42 +17,134 @@ def bit_name(base: str, i: int) -> str:
 def tmp_name(prefix: str, idx: int) -> str:
     return f"tmp_{prefix}_{idx}"
 
-# ---------- helpers: const parsing ----------
-_const_re = re.compile(r"^\s*(\d+)\s*'([bBdDhHoO])\s*([0-9a-fA-FxXzZ_]+)\s*$")
-
-def parse_verilog_const(value: str, width_hint: int = 1) -> list[int]:
-    value = value.strip()
-    m = _const_re.match(value)
-    if m:
-        w = int(m.group(1))
-        base = m.group(2).lower()
-        digits = m.group(3).replace("_", "")
-        digits_clean = re.sub(r"[xXzZ]", "0", digits)
-
-        if base == "b":
-            bits_str = digits_clean.zfill(w)
-            bits = [1 if c == "1" else 0 for c in bits_str[::-1]]
-            return bits[:w]
-        elif base == "d":
-            v = int(digits_clean, 10)
-        elif base == "h":
-            v = int(digits_clean, 16)
-        elif base == "o":
-            v = int(digits_clean, 8)
+# ---------- helpers: operand graph ----------
+def fuse_add_chains(gates) -> tuple[set[int], dict[int, list[Signal]]]:
+    """
+    Find ADD gates whose output feeds exactly one other ADD and fold them into
+    that consumer, so a + b + c becomes a single N-operand sum.
+    Returns (ids of absorbed ADD gates, {id(sink ADD): operand list}).
+    """
+    readers = {}
+    for g in gates:
+        for s in g.inputs:
+            readers.setdefault(s.name, []).append(g)
+
+    drivers = {g.output.name: g for g in gates if g.op_type == "ADD"}
+
+    def fusable(sig, sink):
+        prod = drivers.get(sig.name)
+        if prod is None or sig.is_output or sig.is_reg:
+            return None
+        if len(readers.get(sig.name, [])) != 1:
+            return None
+        # A narrower producer truncates its sum, which the sink must not skip
+        if prod.output.width < sink.output.width:
+            return None
+        return prod
+
+    absorbed = set()
+    operands = {}
+
+    def collect(g, sink, out):
+        for s in g.inputs:
+            prod = fusable(s, sink)
+            if prod is None:
+                out.append(s)
+            else:
+                absorbed.add(id(prod))
+                collect(prod, sink, out)
+
+    for g in gates:
+        if g.op_type != "ADD":
+            continue
+        r = readers.get(g.output.name, [])
+        if len(r) == 1 and r[0].op_type == "ADD" and fusable(g.output, r[0]) is g:
+            continue  # will be absorbed by its consumer
+        ops = []
+        collect(g, g, ops)
+        operands[id(g)] = ops
+
+    return absorbed, operands
+
+def effective_widths(gates) -> dict[str, int]:
+    """
+    Upper bound on the number of low bits of each gate output that can be 1:
+    all bits at or above it are provably 0 (e.g. a 32-bit sum of two 4-bit values
+    has 5). Signals driven by more than one gate, registers and ports keep their
+    full width; signals missing from the result are full width too.
+    """
+    drivers = {}
+    for g in gates:
+        drivers.setdefault(g.output.name, []).append(g)
+
+    eff = {}
+
+    def width_of(sig):
+        v = const_value(sig)
+        if v is not None:
+            return v.bit_length()
+        return eff.get(sig.name, sig.width)
+
+    def rule(g):
+        op = g.op_type
+        ins = g.inputs
+        if op == "ADD":
+            r = max(width_of(s) for s in ins) + 1
+        elif op == "AND":
+            r = min(width_of(s) for s in ins)
+        elif op in ("OR", "XOR", "BUF"):
+            r = max(width_of(s) for s in ins)
+        elif op == "MUX":
+            r = max(width_of(ins[1]), width_of(ins[2]))
+        elif op == "EQ":
+            r = 1
         else:
-            v = 0
-        bits = [(v >> i) & 1 for i in range(w)]
-        return bits
+            return g.output.width
+        return min(g.output.width, r)
+
+    def narrowable(g):
+        out = g.output
+        return not (out.is_input or out.is_reg or len(drivers[out.name]) != 1)
+
+    # Drivers before readers (iterative DFS); signals on a loop stay full width
+    state = {}  # signal name -> 1 visiting, 2 done
+    for root in gates:
+        if not narrowable(root) or root.output.name in state:
+            continue
+        stack = [root]
+        state[root.output.name] = 1
+        while stack:
+            g = stack[-1]
+            for s in g.inputs:
+                d = drivers.get(s.name)
+                if d and s.name not in state and narrowable(d[0]):
+                    state[s.name] = 1
+                    stack.append(d[0])
+                    break
+            else:
+                stack.pop()
+                state[g.output.name] = 2
+                eff[g.output.name] = rule(g)
+    return eff
+
+
+ADDER_ARCHS = ("kogge-stone", "sparse4")
+
+OP_AND, OP_OR, OP_XOR, OP_XNOR = OP_CODE["AND"], OP_CODE["OR"], OP_CODE["XOR"], OP_CODE["XNOR"]
+OP_NOT, OP_BUF, OP_MUX, OP_DFF = OP_CODE["NOT"], OP_CODE["BUF"], OP_CODE["MUX"], OP_CODE["DFF"]
+# tmp signal prefix per op code
+_TMP_PREFIX = tuple(op.lower() for op in OPS)
 
-    try:
-        v = int(value, 0)
-    except Exception:
-        v = 0
-    w = max(1, width_hint)
-    return [(v >> i) & 1 for i in range(w)]
 
+def run(mod, adder: str = "kogge-stone"):
+    """
+    Bit-blast mod in place.
+    adder selects the carry network for ADD: "kogge-stone" (full prefix tree)
+    or "sparse4" (prefix tree over 4-bit ripple blocks, used from 16 bits up).
+    """
+    if adder not in ADDER_ARCHS:
+        raise ValueError(f"Bitblast: unknown adder architecture '{adder}'")
 
-def run(mod):
     # 0) Ensure global CONST0/CONST1 exist
     const0 = mod.get_signal("CONST0")
     if const0 is None:
@@ -66,21 +158,25 @@ def run(mod):
 
     # 1) Build bit-signal mapping
     bits_map = {} 
+    signals = mod.signals
 
     def get_bits(sig: Signal) -> list[Signal]:
+        blist = bits_map.get(sig.name)
+        if blist is not None:
+            return blist
         if sig.width == 1:
-            bits_map[sig.name] = [sig]
-            return [sig]
-        if sig.name in bits_map:
-            return bits_map[sig.name]
-        blist = []
-        for i in range(sig.width):
-            bn = bit_name(sig.name, i)
-            b = mod.get_signal(bn)
-            if b is None:
-                b = Signal(bn, width=1, is_input=sig.is_input, is_output=sig.is_output, is_reg=sig.is_reg)
-                mod.add_signal(b)
-            blist.append(b)
+            blist = [sig]
+        else:
+            blist = []
+            new_bits = {}
+            for i in range(sig.width):
+                bn = bit_name(sig.name, i)
+                b = signals.get(bn)
+                if b is None:
+                    b = Signal(bn, width=1, is_input=sig.is_input, is_output=sig.is_output, is_reg=sig.is_reg)
+                    new_bits[bn] = b
+                blist.append(b)
+            mod.add_signals(new_bits.values())
         bits_map[sig.name] = blist
         return blist
 
@@ -88,59 +184,241 @@ def run(mod):
     for s in list(mod.signals.values()):
         get_bits(s)
 
-    def const_bits_from_signal(sig: Signal, width_hint: int) -> list[Signal]:
-        if not sig.name.startswith("CONST_"):
+    def const_bits_from_signal(sig: Signal) -> list[Signal]:
+        """Bits of a constant at its declared width (CONST0/CONST1 per bit)."""
+        v = const_value(sig)
+        if v is None:
             return get_bits(sig)
-        raw = sig.name.split('_', 1)[1] # remove "CONST_"
-        # Hack to handle CONST_123_32b_ID format from elaboration
-        # We just try to parse the numeric part or rely on parse_verilog_const robustness
-        # Simpler: If it contains 'b/d/h', parse it. If not, assume raw int.
-        # But elaboration might append _ID. Let's rely on the value stored in sig object if possible?
-        # Since we didn't store value in Signal in this file's version, we parse name.
-        # Clean up name: "CONST_7'b0110_id123" -> try to extract 7'b0110
-        # For now, simplistic approach:
-        bits = parse_verilog_const(raw.split('_')[0], width_hint=width_hint)
-        out = []
-        for b in bits:
-            out.append(const1 if b == 1 else const0)
-        return out
+        return [const1 if (v >> i) & 1 else const0 for i in range(sig.width)]
+
+    def drive_const(value: int, out_bits):
+        for i, ob in enumerate(out_bits):
+            drive(const1 if (value >> i) & 1 else const0, ob)
+
+    pad_cache = {}  # (name, width) -> padded/truncated bit list
 
     def get_operand_bits(sig, width):
-        """Helper to get bits, handling Constants and Padding automatically."""
+        """
+        Helper to get bits, handling Constants and Padding automatically.
+        The returned list is shared (cached); callers must not modify it.
+        """
+        # Fast path: a signal already split into exactly `width` bits
+        bits = bits_map.get(sig.name)
+        if bits is not None and len(bits) == width and not sig.name.startswith("CONST_"):
+            return bits
+        key = (sig.name, width)
+        bits = pad_cache.get(key)
+        if bits is not None:
+            return bits
+
         if sig.name.startswith("CONST_"):
-            bits = const_bits_from_signal(sig, width_hint=width)
+            bits = const_bits_from_signal(sig)
         else:
             bits = get_bits(sig)
         
         # Pad with 0s if too short
         if len(bits) < width:
             bits = bits + [const0] * (width - len(bits))
-        return bits[:width]
+        bits = bits[:width]
+        pad_cache[key] = bits
+        return bits
 
     # 2) Rewrite/bitblast gates
-    new_gates = []
     tmp_idx = 0
 
+    # The high-level gates are materialized once (fuse_add_chains keys its results
+    # by Gate object identity); the module's gate columns are then refilled directly
+    # with primitive rows of signal ids, no Gate objects are built per primitive.
+    old_gates = list(mod.gates)
+    mod.gates = []
+
+    # The constructors below run once per emitted gate, so the methods they
+    # use are bound to locals up front.
+    col_op, col_in0, col_in1 = mod.gate_op.append, mod.gate_in0.append, mod.gate_in1.append
+    col_in2, col_out = mod.gate_in2.append, mod.gate_out.append
+
+    def emit(op, i0, i1, i2, out):
+        """Appends one gate row: op code, input ids (-1 = unused), output id."""
+        col_op(op); col_in0(i0); col_in1(i1); col_in2(i2); col_out(out)
+
+    signals_get = signals.get
+    add_signal = mod.add_signal
+
     def new_tmp(prefix="t"):
         nonlocal tmp_idx
         name = tmp_name(prefix, tmp_idx)
         tmp_idx += 1
-        s = mod.get_signal(name)
+        s = signals_get(name)
         if s is None:
             s = Signal(name=name, width=1)
-            mod.add_signal(s)
+            add_signal(s)
         return s
 
     # 1-bit Primitive Constructors
-    def XOR2(a, b, out): new_gates.append(Gate("XOR", [a, b], out))
-    def AND2(a, b, out): new_gates.append(Gate("AND", [a, b], out))
-    def OR2(a, b, out):  new_gates.append(Gate("OR",  [a, b], out))
-    def NOT1(a, out):    new_gates.append(Gate("NOT", [a], out))
+    # Structurally hashed (AIG-style mkGateCached): a gate with the same op and
+    # inputs is only emitted once, and constant operands are folded away.
+    # Each constructor returns the signal carrying its result. If `out` is given,
+    # the result is guaranteed to be driven onto it (via BUF when it came from
+    # the cache or a fold), otherwise a tmp signal is allocated on demand.
+    gate_cache = {}
+    cache_get = gate_cache.get
+
+    def BUF1(a, out): emit(OP_BUF, a.id, -1, -1, out.id)
+
+    def drive(sig, out):
+        if out is None or out is sig:
+            return sig
+        BUF1(sig, out)
+        return out
+
+    def cached(op, key, out, i0, i1=-1, i2=-1):
+        hit = cache_get(key)
+        if hit is not None:
+            return drive(hit, out)
+        if out is None:
+            out = new_tmp(_TMP_PREFIX[op])
+        emit(op, i0, i1, i2, out.id)
+        gate_cache[key] = out
+        return out
+
+    def AND2(a, b, out=None):
+        if a is const0 or b is const0: return drive(const0, out)
+        if a is const1 or a is b:      return drive(b, out)
+        if b is const1:                return drive(a, out)
+        ia, ib = a.id, b.id
+        return cached(OP_AND, (OP_AND, ia, ib) if ia < ib else (OP_AND, ib, ia), out, ia, ib)
+
+    def OR2(a, b, out=None):
+        if a is const1 or b is const1: return drive(const1, out)
+        if a is const0 or a is b:      return drive(b, out)
+        if b is const0:                return drive(a, out)
+        ia, ib = a.id, b.id
+        return cached(OP_OR, (OP_OR, ia, ib) if ia < ib else (OP_OR, ib, ia), out, ia, ib)
+
+    def XOR2(a, b, out=None):
+        if a is b:      return drive(const0, out)
+        if a is const0: return drive(b, out)
+        if b is const0: return drive(a, out)
+        if a is const1: return NOT1(b, out)
+        if b is const1: return NOT1(a, out)
+        ia, ib = a.id, b.id
+        return cached(OP_XOR, (OP_XOR, ia, ib) if ia < ib else (OP_XOR, ib, ia), out, ia, ib)
+
+    def XNOR2(a, b, out=None):
+        if a is b:      return drive(const1, out)
+        if a is const1: return drive(b, out)
+        if b is const1: return drive(a, out)
+        if a is const0: return NOT1(b, out)
+        if b is const0: return NOT1(a, out)
+        ia, ib = a.id, b.id
+        return cached(OP_XNOR, (OP_XNOR, ia, ib) if ia < ib else (OP_XNOR, ib, ia), out, ia, ib)
+
+    def NOT1(a, out=None):
+        if a is const0: return drive(const1, out)
+        if a is const1: return drive(const0, out)
+        ia = a.id
+        return cached(OP_NOT, (OP_NOT, ia), out, ia)
+
     # MUX Convention: [Select, True_Input(1), False_Input(0)]
-    def MUX2(sel, d1, d0, out): new_gates.append(Gate("MUX", [sel, d1, d0], out))
-    def DFF(d, clk, q):  new_gates.append(Gate("DFF", [d, clk], q))
+    def MUX2(sel, d1, d0, out=None):
+        if sel is const1 or d1 is d0: return drive(d1, out)
+        if sel is const0:             return drive(d0, out)
+        ia, ib, ic = sel.id, d1.id, d0.id
+        return cached(OP_MUX, (OP_MUX, ia, ib, ic), out, ia, ib, ic)
+
+    def DFF(d, clk, q):  emit(OP_DFF, d.id, clk.id, -1, q.id)
+
+    def reduce_tree(constructor, bits, empty):
+        """Balanced binary reduction of bits with a 2-input constructor."""
+        level = list(bits)
+        if not level:
+            return empty
+        while len(level) > 1:
+            nxt = [constructor(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                nxt.append(level[-1])
+            level = nxt
+        return level[0]
+
+    def FA(a, b, c):
+        """Full adder (3:2 compressor). Returns (sum, carry)."""
+        s = XOR2(XOR2(a, b), c)
+        t_ab = AND2(a, b)
+        t_ac = AND2(a, c)
+        t_bc = AND2(b, c)
+        cout = OR2(OR2(t_ab, t_ac), t_bc)
+        return s, cout
+
+    def HA(a, b):
+        """Half adder (2:2 compressor). Returns (sum, carry)."""
+        return XOR2(a, b), AND2(a, b)
+
+    def prefix_carries(G, P):
+        """
+        Kogge-Stone prefix tree over (generate, propagate) pairs.
+        Returns G where G[i] is the carry out of position i (carry-in 0).
+        """
+        G, P = list(G), list(P)
+        n = len(G)
+        d = 1
+        while d < n:
+            G_next, P_next = list(G), list(P)
+            for i in range(d, n):
+                G_next[i] = OR2(G[i], AND2(P[i], G[i - d]))
+                # P is only read again by positions that still look 2d back
+                if i >= 2 * d:
+                    P_next[i] = AND2(P[i], P[i - d])
+            G, P = G_next, P_next
+            d *= 2
+        return G
+
+    def prefix_add(a_bits, b_bits, out_bits):
+        """Two-operand adder: out = a + b (mod 2^w) via a parallel-prefix carry network."""
+        w = len(out_bits)
+        if w == 0:
+            return
+        g = [AND2(a_bits[i], b_bits[i]) for i in range(w)]
+        # Bit 0 has no carry-in, so its propagate already is the sum bit
+        p = [XOR2(a_bits[0], b_bits[0], out_bits[0])]
+        p += [XOR2(a_bits[i], b_bits[i]) for i in range(1, w)]
+
+        if adder == "sparse4" and w >= 16:
+            # Sparsity-4: prefix tree over 4-bit block (G, P), ripple inside blocks
+            blocks = [range(k, min(k + 4, w)) for k in range(0, w, 4)]
+            block_G = []
+            block_P = []
+            for blk in blocks:
+                bg, bp = g[blk[0]], p[blk[0]]
+                for i in blk[1:]:
+                    bg, bp = OR2(g[i], AND2(p[i], bg)), AND2(p[i], bp)
+                block_G.append(bg)
+                block_P.append(bp)
+            block_carry = prefix_carries(block_G, block_P)
+
+            for k, blk in enumerate(blocks):
+                c = const0 if k == 0 else block_carry[k - 1]
+                for i in blk:
+                    if i > 0:
+                        XOR2(p[i], c, out_bits[i])
+                    if i != blk[-1]:
+                        c = OR2(g[i], AND2(p[i], c))
+            return
 
-    for g in mod.gates:
+        carries = prefix_carries(g, p)
+        for i in range(1, w):
+            XOR2(p[i], carries[i - 1], out_bits[i])
+
+    add_absorbed, add_operands = fuse_add_chains(old_gates)
+    eff_widths = effective_widths(old_gates)
+
+    def eff_width(sig):
+        """Number of low bits of sig that can be non-zero."""
+        v = const_value(sig)
+        if v is not None:
+            return v.bit_length()
+        return eff_widths.get(sig.name, sig.width)
+
+    for g in old_gates:
         op = g.op_type
         
         # -------- BITWISE OPS (AND, OR, XOR) --------
@@ -168,37 +446,25 @@ def run(mod):
             
             # Width is max of inputs
             w = max(a.width, b.width)
+
+            # Constant == constant: compare packed values, no gate tree needed
+            va, vb = const_value(a), const_value(b)
+            if va is not None and vb is not None:
+                drive_const(int(va == vb), get_bits(out))
+                continue
+
+            # Bits above both operands' effective widths are 0 on both sides
+            w = min(w, max(eff_width(a), eff_width(b)))
+
             a_bits = get_operand_bits(a, w)
             b_bits = get_operand_bits(b, w)
             
             # Logic: (A0 XNOR B0) & (A1 XNOR B1) ...
             
-            eq_bits = []
-            for i in range(w):
-                # XNOR = NOT(XOR)
-                t_xor = new_tmp("xor_eq")
-                t_xnor = new_tmp("xnor_eq")
-                XOR2(a_bits[i], b_bits[i], t_xor)
-                NOT1(t_xor, t_xnor)
-                eq_bits.append(t_xnor)
+            eq_bits = [XNOR2(a_bits[i], b_bits[i]) for i in range(w)]
             
-            # Reduce AND
-            if not eq_bits:
-                # Empty comparison? True
-                # Connect out to 1 (Buffer)
-                AND2(const1, const1, get_bits(out)[0]) 
-            elif len(eq_bits) == 1:
-                # Buffer the single result to output
-                # Using AND with 1 as buffer
-                AND2(eq_bits[0], const1, get_bits(out)[0])
-            else:
-                curr = eq_bits[0]
-                for i in range(1, len(eq_bits)):
-                    next_tmp = new_tmp("and_red")
-                    AND2(curr, eq_bits[i], next_tmp)
-                    curr = next_tmp
-                # Connect final result
-                AND2(curr, const1, get_bits(out)[0])
+            # Reduce AND (balanced tree, depth ceil(log2 W)); empty comparison is true
+            drive(reduce_tree(AND2, eq_bits, const1), get_bits(out)[0])
             continue
 
         # -------- MULTIPLEXER (MUX) --------
@@ -208,7 +474,7 @@ def run(mod):
             out = g.output
             w = out.width
             
-            sel_bit = get_bits(sel)[0] # Select is always 1 bit
+            sel_bit = get_operand_bits(sel, 1)[0] # Select is always 1 bit
             
             t_bits = get_operand_bits(t_in, w)
             f_bits = get_operand_bits(f_in, w)
@@ -220,38 +486,79 @@ def run(mod):
                 MUX2(sel_bit, t_bits[i], f_bits[i], out_bits[i])
             continue
 
-        # -------- ADD (Ripple Carry) --------
+        # -------- ADD (Carry-Save Tree + Prefix Adder) --------
         if op == "ADD":
-            a, b = g.inputs
+            if id(g) in add_absorbed:
+                continue  # folded into the ADD consuming its output
             out = g.output
             w = out.width
-            
-            a_bits = get_operand_bits(a, w)
-            b_bits = get_operand_bits(b, w)
             out_bits = get_bits(out)
 
-            carry = const0
+            # Constant operands are summed up front into a single addend;
+            # if everything is constant the result is driven directly.
+            operands = []
+            const_sum = 0
+            for operand in add_operands[id(g)]:
+                v = const_value(operand)
+                if v is not None:
+                    const_sum += v
+                else:
+                    operands.append(operand)
+            const_sum &= (1 << w) - 1
+            if not operands:
+                drive_const(const_sum, out_bits)
+                continue
+
+            # The sum of n addends fits in (widest effective width + ceil(log2 n))
+            # bits; only those columns are built, the output bits above are 0.
+            n = len(operands) + (1 if const_sum else 0)
+            w_full = w
+            w = min(w, max([const_sum.bit_length()] + [eff_width(o) for o in operands])
+                       + (n - 1).bit_length())
+            drive_const(0, out_bits[w:])
+            out_bits = out_bits[:w]
+
+            # Dot diagram: one column of addend bits per bit weight.
+            # Constant zeros add nothing and are left out.
+            column_dots = {i: [] for i in range(w)}
             for i in range(w):
-                # sum = a ^ b ^ carry
-                t1 = new_tmp("xor")
-                XOR2(a_bits[i], b_bits[i], t1)
-                
-                sbit = out_bits[i]
-                XOR2(t1, carry, sbit)
-
-                # carry_out logic
-                t_ab = new_tmp("and")
-                t_ac = new_tmp("and")
-                t_bc = new_tmp("and")
-                AND2(a_bits[i], b_bits[i], t_ab)
-                AND2(a_bits[i], carry, t_ac)
-                AND2(b_bits[i], carry, t_bc)
-
-                t_or1 = new_tmp("or")
-                OR2(t_ab, t_ac, t_or1)
-                cnext = new_tmp("or")
-                OR2(t_or1, t_bc, cnext)
-                carry = cnext
+                if (const_sum >> i) & 1:
+                    column_dots[i].append(const1)
+            for operand in operands:
+                bits = get_operand_bits(operand, w_full)
+                for i in range(min(w, eff_width(operand))):
+                    if bits[i] is not const0:
+                        column_dots[i].append(bits[i])
+
+            # Compressor tree (Dadda schedule): each stage only compresses a column
+            # down to the next target height (2, 3, 4, 6, 9, ...), counting the carries
+            # it receives from the column below, so carries never ripple within a stage.
+            while w and max(len(v) for v in column_dots.values()) > 2:
+                height = max(len(v) for v in column_dots.values())
+                target = 2
+                while target * 3 // 2 < height:
+                    target = target * 3 // 2
+                nxt = {i: [] for i in range(w)}
+                for i in range(w):
+                    dots = column_dots[i]
+                    k = 0
+                    while len(dots) - k + len(nxt[i]) > target and len(dots) - k >= 2:
+                        excess = len(dots) - k + len(nxt[i]) - target
+                        if excess >= 2 and len(dots) - k >= 3:
+                            s, c = FA(dots[k], dots[k + 1], dots[k + 2])
+                            k += 3
+                        else:
+                            s, c = HA(dots[k], dots[k + 1])
+                            k += 2
+                        nxt[i].append(s)
+                        if i + 1 < w:
+                            nxt[i + 1].append(c)
+                    nxt[i].extend(dots[k:])
+                column_dots = nxt
+
+            # Final carry-propagate adder over the two remaining rows
+            rows = [column_dots[i] + [const0] * (2 - len(column_dots[i])) for i in range(w)]
+            prefix_add([r[0] for r in rows], [r[1] for r in rows], out_bits)
             continue
 
         # -------- DFF_EN_RST (Macro) --------
@@ -272,12 +579,10 @@ def run(mod):
 
             for i in range(w):
                 # mux_en = en ? d_en : q_old
-                mux_en = new_tmp("mux")
-                MUX2(en_b, d_en_bits[i], q_old_bits[i], mux_en)
+                mux_en = MUX2(en_b, d_en_bits[i], q_old_bits[i])
 
                 # mux_rst = rst ? d_rst : mux_en
-                mux_rst = new_tmp("mux")
-                MUX2(rst_b, d_rst_bits[i], mux_en, mux_rst)
+                mux_rst = MUX2(rst_b, d_rst_bits[i], mux_en)
 
                 DFF(mux_rst, clk_b, q_bits[i])
             continue
@@ -290,11 +595,13 @@ def run(mod):
             if op == "NOT":
                 NOT1(get_bits(inp)[0], get_bits(out)[0])
             elif op == "BUF":
-                # Using AND with 1 as buffer
-                AND2(get_bits(inp)[0], const1, get_bits(out)[0])
+                # Word-level buffer: connect every output bit
+                in_bits = get_operand_bits(inp, out.width)
+                for i, ob in enumerate(get_bits(out)):
+                    drive(in_bits[i], ob)
             continue
 
         raise NotImplementedError(f"Bitblast: unsupported gate type {op}")
 
-    mod.gates = new_gates
-    mod.save_json("debug_03_bitblast.json")
\ No newline at end of file
+    if debug_enabled():
+        mod.save_json("debug_03_bitblast.json")
\ No newline at end of file
@@ -9,7 +9,7 @@
 
 import os
 import re
-from netlist import Module, Signal, Gate
+from netlist import Module, Signal, Gate, debug_enabled
 
 from pyverilog.vparser.ast import (
     Source, Description, ModuleDef,
@@ -24,27 +24,28 @@ from pyverilog.vparser.ast import (
 # Helpers
 # -------------------------------------------------------------------------
 
+# Sized/based Verilog literal: <width>'[s]<base><digits>, e.g. 4'b1010, 4'sd5
+_CONST_RE = re.compile(r"^\s*(?P<width>\d*)\s*'[sS]?(?P<base>[bBdDhHoO])\s*(?P<digits>[0-9a-fA-FxXzZ_]+)\s*$")
+_DECL_WIDTH_RE = re.compile(r"^\s*(\d+)\s*'[sS]?[bBdDhHoO]")
+_BASES = {"b": 2, "o": 8, "d": 10, "h": 16}
+# x/z digits are treated as 0, "_" separators are dropped
+_XZ_TABLE = str.maketrans("xXzZ", "0000", "_")
+
 def _parse_const_value(val_str):
     """
-    Parses Verilog constants like "4'b1010", "32'd100", or "5'bxxxxx"
+    Parses Verilog constants like "4'b1010", "32'd100", "4'sd5" or "5'bxxxxx".
+    Signed literals keep their bit pattern. Raises ValueError on anything else.
     """
-    if "'" in val_str:
-        width_part, val_part = val_str.split("'")
-        base = val_part[0].lower() # 'b', 'h', 'd'
-        number = val_part[1:]
-        
+    m = _CONST_RE.match(val_str)
+    if m:
         # Handle "don't cares" (x) by treating them as 0 for now
-        number = number.replace('x', '0').replace('z', '0')
-        
+        number = m.group("digits").translate(_XZ_TABLE)
         try:
-            if base == 'b':
-                return int(number, 2)
-            elif base == 'h':
-                return int(number, 16)
-            elif base == 'd':
-                return int(number)
+            return int(number, _BASES[m.group("base").lower()])
         except ValueError:
-            return 0
+            raise ValueError(f"Elaboration: invalid digits in constant '{val_str}'") from None
+    if "'" in val_str:
+        raise ValueError(f"Elaboration: unsupported constant '{val_str}'")
     return int(val_str)
 
 def _parse_width(node):
@@ -75,18 +76,22 @@ def _get_or_create_signal(mod: Module, name: str, width=1, **attrs):
 
 def _intconst_decl_width(value: str):
     """Parse Verilog sized constant like: 4'b0 -> returns 4."""
-    m = re.match(r"^\s*(\d+)\s*'[bBdDhHoO].*$", value)
+    m = _DECL_WIDTH_RE.match(value)
     return int(m.group(1)) if m else None
 
 # -------------------------------------------------------------------------
 # Expression Parsing (Recursion)
 # -------------------------------------------------------------------------
 
-def _expr_to_signal_and_gates(mod: Module, expr, expected_width=None):
+def _expr_to_signal_and_gates(mod: Module, expr, expected_width=None, cache=None):
     """
     Converts an AST expression (A+B, A==B) into Signals and Gates.
     Returns: (output_signal, list_of_new_gates)
+    cache maps (id(AST node), expected_width) -> Signal for operator nodes
+    that were already synthesized; a hit returns no new gates.
     """
+    if cache is None:
+        cache = {}
     extra_gates = []
 
     # 1. Identifier (Variables)
@@ -103,7 +108,8 @@ def _expr_to_signal_and_gates(mod: Module, expr, expected_width=None):
         declared_w = _intconst_decl_width(expr.value)
         w = declared_w or expected_width or 32 # Default to 32 if unknown
         
-        const_name = f"CONST_{val}_{w}b_{id(expr)}"
+        # Keyed by value and width only: identical literals share one Signal
+        const_name = f"CONST_{val}_{w}b"
         s = _get_or_create_signal(mod, const_name, width=w)
         return s, extra_gates
 
@@ -117,6 +123,11 @@ def _expr_to_signal_and_gates(mod: Module, expr, expected_width=None):
     
     expr_type = type(expr)
     if expr_type in op_map:
+        key = (id(expr), expected_width)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit, extra_gates
+
         op_name = op_map[expr_type]
         
         # Recurse Left/Right
@@ -124,8 +135,8 @@ def _expr_to_signal_and_gates(mod: Module, expr, expected_width=None):
         # For Arithmetic (ADD), they usually do.
         req_w = expected_width if op_name == "ADD" else None
         
-        a_sig, a_g = _expr_to_signal_and_gates(mod, expr.left, expected_width=req_w)
-        b_sig, b_g = _expr_to_signal_and_gates(mod, expr.right, expected_width=req_w)
+        a_sig, a_g = _expr_to_signal_and_gates(mod, expr.left, expected_width=req_w, cache=cache)
+        b_sig, b_g = _expr_to_signal_and_gates(mod, expr.right, expected_width=req_w, cache=cache)
         extra_gates.extend(a_g)
         extra_gates.extend(b_g)
 
@@ -135,10 +146,11 @@ def _expr_to_signal_and_gates(mod: Module, expr, expected_width=None):
         else:
             out_w = expected_width or max(a_sig.width, b_sig.width)
 
-        tmp_name = f"tmp_{op_name}_{len(mod.gates)}"
+        tmp_name = mod.fresh_name(f"tmp_{op_name}")
         tmp = _get_or_create_signal(mod, tmp_name, width=out_w)
 
         extra_gates.append(Gate(op_name, [a_sig, b_sig], tmp))
+        cache[key] = tmp
         return tmp, extra_gates
 
     raise NotImplementedError(f"Expression not supported yet: {type(expr).__name__}")
@@ -147,11 +159,12 @@ def _expr_to_signal_and_gates(mod: Module, expr, expected_width=None):
 # MUX Tree Building (For nested if-else)
 # -------------------------------------------------------------------------
 
-def _build_mux_tree(mod, stmt, target_name):
+def _build_mux_tree(mod, stmt, target_name, cache=None):
     """
     Recursively converts a statement (Block, If, or Assignment) into a Signal.
     Used for Combinational Logic (always @*).
     Returns: (result_signal, list_of_gates)
+    cache is the expression cache shared with _expr_to_signal_and_gates.
     """
     gates = []
 
@@ -163,7 +176,7 @@ def _build_mux_tree(mod, stmt, target_name):
             return None, []
         # In a real compiler we'd handle multiple statements. 
         # For this MVP, we assume the block wraps the logic flow.
-        return _build_mux_tree(mod, stmt.statements[0], target_name)
+        return _build_mux_tree(mod, stmt.statements[0], target_name, cache)
 
     # Case B: Assignment (Base Case)
     # Handles: ALU_operation = ...
@@ -175,22 +188,22 @@ def _build_mux_tree(mod, stmt, target_name):
         
         # Convert RHS to signal
         target_sig = mod.get_signal(target_name)
-        rhs_sig, g = _expr_to_signal_and_gates(mod, stmt.right.var, expected_width=target_sig.width)
+        rhs_sig, g = _expr_to_signal_and_gates(mod, stmt.right.var, expected_width=target_sig.width, cache=cache)
         return rhs_sig, g
 
     # Case C: If Statement (Recursive MUX)
     if isinstance(stmt, IfStatement):
         # 1. Condition
-        cond_sig, cond_gates = _expr_to_signal_and_gates(mod, stmt.cond)
+        cond_sig, cond_gates = _expr_to_signal_and_gates(mod, stmt.cond, cache=cache)
         gates.extend(cond_gates)
 
         # 2. True Branch
-        true_sig, true_gates = _build_mux_tree(mod, stmt.true_statement, target_name)
+        true_sig, true_gates = _build_mux_tree(mod, stmt.true_statement, target_name, cache)
         gates.extend(true_gates)
 
         # 3. False Branch
         if stmt.false_statement:
-            false_sig, false_gates = _build_mux_tree(mod, stmt.false_statement, target_name)
+            false_sig, false_gates = _build_mux_tree(mod, stmt.false_statement, target_name, cache)
             gates.extend(false_gates)
         else:
             # Implicit else: keep previous value (latch inference) 
@@ -204,7 +217,7 @@ def _build_mux_tree(mod, stmt, target_name):
             return None, []
 
         # 4. Create MUX
-        mux_out_name = f"mux_{target_name}_{len(mod.gates)}"
+        mux_out_name = mod.fresh_name(f"mux_{target_name}")
         mux_out = _get_or_create_signal(mod, mux_out_name, width=true_sig.width)
         
         # Gates convention: MUX [Select, True_Input, False_Input] -> Output
@@ -214,6 +227,21 @@ def _build_mux_tree(mod, stmt, target_name):
 
     return None, []
 
+def _collect_lhs(stmt, out: set):
+    """
+    Preorder walk of a statement tree, adding every assigned variable name to `out`.
+    Used to find which signals an always @* block actually drives.
+    """
+    if isinstance(stmt, Block):
+        for s in stmt.statements:
+            _collect_lhs(s, out)
+    elif isinstance(stmt, IfStatement):
+        _collect_lhs(stmt.true_statement, out)
+        if stmt.false_statement:
+            _collect_lhs(stmt.false_statement, out)
+    elif isinstance(stmt, (BlockingSubstitution, NonblockingSubstitution)):
+        out.add(stmt.left.var.name)
+
 # -------------------------------------------------------------------------
 # Main Run Loop
 # -------------------------------------------------------------------------
@@ -239,9 +267,17 @@ def run(ast):
                 is_reg = isinstance(second, Reg)
                 _get_or_create_signal(mod, first.name, width=width, is_output=True, is_reg=is_reg)
 
+    # Signals an always block may drive (ports are the only declarations we track)
+    # (name -> declaration order, so each block only looks at the names it assigns)
+    target_candidates = {s.name: i for i, s in enumerate(mod.signals.values()) if s.is_output or s.is_reg}
+
     # 2. Parse Items (Always Blocks)
     for item in top.items:
         if isinstance(item, Always):
+            # Synthesized sub-expressions of this block (AST nodes are never
+            # shared between always blocks, so the cache does not outlive it)
+            expr_cache = {}
+
             # Check sensitivity list to distinguish Sequential vs Combinational
             is_clocked = False
             senslist = item.sens_list
@@ -272,7 +308,7 @@ def run(ast):
                     target_sig = _get_or_create_signal(mod, target_name)
                     
                     # Reset Value
-                    rst_val_sig, g_rst = _expr_to_signal_and_gates(mod, then_stmt.right.var, target_sig.width)
+                    rst_val_sig, g_rst = _expr_to_signal_and_gates(mod, then_stmt.right.var, target_sig.width, expr_cache)
                     for g in g_rst: mod.add_gate(g)
 
                     # Enable / Else
@@ -284,7 +320,7 @@ def run(ast):
                         en_then = else_stmt.true_statement
                         if isinstance(en_then, Block): en_then = en_then.statements[0]
                         
-                        next_val_sig, g_next = _expr_to_signal_and_gates(mod, en_then.right.var, target_sig.width)
+                        next_val_sig, g_next = _expr_to_signal_and_gates(mod, en_then.right.var, target_sig.width, expr_cache)
                         for g in g_next: mod.add_gate(g)
 
                         # Create DFF Primitive
@@ -298,20 +334,24 @@ def run(ast):
                 # We identify the target variable by looking at the first assignment
                 # (MVP Limitation: assumes always block drives one main variable)
                 
-                # 1. Find the target name (hacky peek)
-                # We need to traverse deep to find the LHS of an assignment
-                # For now, let's just process the whole tree and hope it returns a signal
-                # corresponding to the output port.
-                
+                # 1. Find the target names
+                # One preorder walk collects the LHS of every assignment, so we only
+                # build mux trees for signals the block actually drives instead of
+                # trying every output/reg.
                 # In ALUControl, the target is "ALU_operation"
-                # We can try to infer it, or iterate over all outputs to see which one is driven.
-                # Let's try to build the tree for 'ALU_operation' specifically if it exists.
-                
-                target_candidates = [s.name for s in mod.signals.values() if s.is_output or s.is_reg]
+                assigned = set()
+                _collect_lhs(item.statement, assigned)
                 
-                for target_name in target_candidates:
-                    # Try to build a mux tree for this target
-                    final_sig, gates = _build_mux_tree(mod, item.statement, target_name)
+                for target_name in sorted(assigned.intersection(target_candidates), key=target_candidates.get):
+                    # Try to build a mux tree for this target.
+                    # A failed build discards its gates, so cache entries it added
+                    # must be dropped as well (they would point at undriven signals).
+                    # Entries are only ever inserted, so those are the newest ones.
+                    cache_len = len(expr_cache)
+                    final_sig, gates = _build_mux_tree(mod, item.statement, target_name, expr_cache)
+                    if not final_sig:
+                        while len(expr_cache) > cache_len:
+                            expr_cache.popitem()
                     
                     if final_sig:
                         # Success! We found logic driving this signal.
@@ -323,5 +363,6 @@ def run(ast):
                         # We use a buffer or just rename (for MVP, buffer)
                         mod.add_gate(Gate("BUF", [final_sig], mod.get_signal(target_name)))
 
-    mod.save_json("debug_02_elab.json")
+    if debug_enabled():
+        mod.save_json("debug_02_elab.json")
     return mod
\ No newline at end of file
@@ -1,7 +1,47 @@
 # stage_export.py
 # Export a gate-level netlist (after bit-blasting) into BLIF format.
 
-from netlist import Module
+from netlist import Module, OPS
+
+# Emitters: one per primitive, returning its .names/.latch block without the
+# trailing newline. Arguments are the names in the gate's three input slots
+# (unused slots are "") and the output name.
+def _emit_not(a, b, c, out):
+    return ".names %s %s\n0 1" % (a, out)           # If Input is 0, Output is 1
+
+def _emit_buf(a, b, c, out):
+    return ".names %s %s\n1 1" % (a, out)           # If Input is 1, Output is 1
+
+def _emit_and(a, b, c, out):
+    return ".names %s %s %s\n11 1" % (a, b, out)
+
+def _emit_or(a, b, c, out):
+    return ".names %s %s %s\n1- 1\n-1 1" % (a, b, out)
+
+def _emit_xor(a, b, c, out):
+    return ".names %s %s %s\n10 1\n01 1" % (a, b, out)
+
+def _emit_xnor(a, b, c, out):
+    return ".names %s %s %s\n00 1\n11 1" % (a, b, out)
+
+def _emit_mux(a, b, c, out):
+    # Convention: inputs = [sel, true_in, false_in]
+    # Sel=1, True=1 -> 1 / Sel=0, False=1 -> 1
+    return ".names %s %s %s %s\n11- 1\n0-1 1" % (a, b, c, out)
+
+def _emit_dff(a, b, c, out):
+    # Convention: inputs = [d, clk]
+    return ".latch %s %s re %s 0" % (a, out, b)
+
+HANDLERS = {
+    "NOT": _emit_not, "BUF": _emit_buf, "AND": _emit_and, "OR": _emit_or,
+    "XOR": _emit_xor, "XNOR": _emit_xnor, "MUX": _emit_mux, "DFF": _emit_dff,
+}
+# Handler per netlist op code; None for ops that must be bit-blasted first
+HANDLERS_BY_CODE = [HANDLERS.get(op) for op in OPS]
+
+# Global constant nets, driven by the model itself rather than being ports
+CONST_NAMES = frozenset(("CONST0", "CONST1"))
 
 def run(mod: Module, out_path: str):
     """
@@ -9,88 +49,45 @@ def run(mod: Module, out_path: str):
     Called by main.py as: stage_export.run(my_module, args.output)
     """
 
-    # 1) Collect primary inputs / outputs
-    inputs = []
-    outputs = []
-
-    for s in mod.signals.values():
-        if s.name in ("CONST0", "CONST1"):
-            continue
-        # Only export 1-bit primary ports in BLIF
-        if s.width != 1:
-            continue
-        if s.is_input:
-            inputs.append(s.name)
-        if s.is_output:
-            outputs.append(s.name)
-
-    inputs = sorted(set(inputs))
-    outputs = sorted(set(outputs))
-
-    # 2) Write BLIF
+    # 1) Collect primary inputs / outputs (only 1-bit ports are exported in BLIF).
+    # Signal names are unique dict keys, so no de-duplication is needed;
+    # the lists are sorted to keep the port order independent of elaboration.
+    ports = [s for s in mod.signals.values() if s.width == 1 and s.name not in CONST_NAMES]
+    inputs = sorted(s.name for s in ports if s.is_input)
+    outputs = sorted(s.name for s in ports if s.is_output)
+
+    # 2) Build BLIF text in memory, write it once at the end
+    lines = []
+    w = lines.append
+
+    w(f".model {mod.name}")
+    if inputs:  w(".inputs " + " ".join(inputs))
+    if outputs: w(".outputs " + " ".join(outputs))
+    w("")
+
+    # 3) Emit constant drivers
+    # Check if they exist in the netlist to avoid empty definitions
+    if mod.get_signal("CONST0"):
+        w(".names CONST0\n")  # Logic 0
+
+    if mod.get_signal("CONST1"):
+        w(".names CONST1\n1") # Logic 1
+    w("")
+
+    # 4) Emit gates: one pass over the gate columns.
+    # names[-1] is "" so that unused input slots (-1) format harmlessly.
+    names = [s.name for s in mod.signal_list]
+    names.append("")
+    handlers = HANDLERS_BY_CODE
+    for op, i0, i1, i2, o in zip(mod.gate_op, mod.gate_in0, mod.gate_in1, mod.gate_in2, mod.gate_out):
+        emit = handlers[op]
+        if emit is None:
+            raise NotImplementedError(f"Export: unsupported gate type '{OPS[op]}'")
+        w(emit(names[i0], names[i1], names[i2], names[o]))
+
+    w(".end\n")
+
     with open(out_path, "w") as f:
-        def w(line: str = ""):
-            f.write(line + "\n")
-
-        w(f".model {mod.name}")
-        if inputs:  w(".inputs " + " ".join(inputs))
-        if outputs: w(".outputs " + " ".join(outputs))
-        w("")
-
-        # 3) Emit constant drivers
-        # Check if they exist in the netlist to avoid empty definitions
-        if mod.get_signal("CONST0"):
-            w(".names CONST0")
-            w("")  # Logic 0
-
-        if mod.get_signal("CONST1"):
-            w(".names CONST1")
-            w("1") # Logic 1
-        w("")
-
-        # 4) Emit gates
-        for g in mod.gates:
-            op = g.op_type
-            ins = [s.name for s in g.inputs]
-            out = g.output.name
-
-            if op == "NOT":
-                w(f".names {ins[0]} {out}")
-                w("0 1") # If Input is 0, Output is 1
-
-            elif op == "BUF":
-                w(f".names {ins[0]} {out}")
-                w("1 1") # If Input is 1, Output is 1
-
-            elif op == "AND":
-                w(f".names {ins[0]} {ins[1]} {out}")
-                w("11 1")
-
-            elif op == "OR":
-                w(f".names {ins[0]} {ins[1]} {out}")
-                w("1- 1")
-                w("-1 1")
-
-            elif op == "XOR":
-                w(f".names {ins[0]} {ins[1]} {out}")
-                w("10 1")
-                w("01 1")
-
-            elif op == "MUX":
-                # Convention: inputs = [sel, true_in, false_in]
-                sel, t_in, f_in = ins
-                w(f".names {sel} {t_in} {f_in} {out}")
-                w("11- 1") # Sel=1, True=1 -> 1
-                w("0-1 1") # Sel=0, False=1 -> 1
-
-            elif op == "DFF":
-                # Convention: inputs = [d, clk]
-                d, clk = ins
-                w(f".latch {d} {out} re {clk} 0")
-
-            else:
-                raise NotImplementedError(f"Export: unsupported gate type '{op}'")
-
-        w(".end")
+        f.write("\n".join(lines))
     
     print(f"Exported BLIF to {out_path}")
\ No newline at end of file
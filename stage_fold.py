@@ -0,0 +1,162 @@
+# stage_fold.py
+# Peephole constant folding + dead-gate elimination on the high-level netlist.
+# Runs between elaboration and bit-blasting, so folded logic is never expanded.
+# Supports:
+# - MUX with constant select, or identical data inputs -> picked input
+# - AND/OR/XOR with constant operands (x&0 -> 0, x|1..1 -> 1..1, x^0 -> x, ...)
+# - EQ/ADD of two constants -> constant
+# - BUF chains collapsed
+# - Gates that do not reach an output port or register are dropped
+
+from netlist import Module, Signal, Gate, const_value
+
+def _get_const(mod: Module, value: int, width: int) -> Signal:
+    name = f"CONST_{value}_{width}b"
+    s = mod.get_signal(name)
+    if s is None:
+        s = Signal(name=name, width=width)
+        mod.add_signal(s)
+    return s
+
+def _input_drivers(g: Gate, drivers):
+    return iter([d for s in g.inputs for d in drivers.get(s.name, ())])
+
+def _topo_order(gates, drivers):
+    """Gates ordered so that drivers come before readers (cycles are cut)."""
+    order = []
+    state = {}  # id(gate) -> 1 visiting, 2 done
+    for root in gates:
+        if id(root) in state:
+            continue
+        state[id(root)] = 1
+        stack = [(root, _input_drivers(root, drivers))]
+        while stack:
+            g, it = stack[-1]
+            for d in it:
+                if id(d) not in state:
+                    state[id(d)] = 1
+                    stack.append((d, _input_drivers(d, drivers)))
+                    break
+            else:
+                stack.pop()
+                state[id(g)] = 2
+                order.append(g)
+    return order
+
+def _fold(g: Gate):
+    """
+    Try to simplify gate g (inputs already substituted).
+    Returns the Signal (or int constant) carrying its result, or None.
+    """
+    op = g.op_type
+    w = g.output.width
+    mask = (1 << w) - 1
+
+    if op == "BUF":
+        return g.inputs[0]
+
+    if op == "MUX":
+        sel, t_in, f_in = g.inputs
+        sv = const_value(sel)
+        if sv is not None:
+            return t_in if sv & 1 else f_in
+        if t_in is f_in:
+            return t_in
+        return None
+
+    if op in ("AND", "OR", "XOR", "EQ", "ADD"):
+        a, b = g.inputs
+        va, vb = const_value(a), const_value(b)
+        if va is not None and vb is not None:
+            if op == "EQ":
+                return int(va == vb)
+            if op == "ADD":
+                return (va + vb) & mask
+            if op == "AND":
+                return va & vb & mask
+            if op == "OR":
+                return (va | vb) & mask
+            return (va ^ vb) & mask
+
+        # One constant operand: c is its value (truncated), x the other operand
+        if va is not None:
+            c, x = va & mask, b
+        elif vb is not None:
+            c, x = vb & mask, a
+        else:
+            return None
+        if op == "AND":
+            if c == 0:    return 0
+            if c == mask: return x
+        elif op == "OR":
+            if c == mask: return mask
+            if c == 0:    return x
+        elif op == "XOR" or op == "ADD":
+            if c == 0:    return x
+    return None
+
+def run(mod: Module):
+    gates = list(mod.gates)
+
+    drivers = {}
+    for g in gates:
+        drivers.setdefault(g.output.name, []).append(g)
+
+    # 1) Fold in topological order, substituting already-folded signals
+    alias = {}  # signal name -> Signal that replaces it
+
+    def resolve(s):
+        seen = set()
+        while s.name in alias and s.name not in seen:
+            seen.add(s.name)
+            s = alias[s.name]
+        return s
+
+    folded = 0
+    new_gates = []
+    for g in _topo_order(gates, drivers):
+        g.inputs = [resolve(s) for s in g.inputs]
+        res = _fold(g)
+        if res is None:
+            new_gates.append(g)
+            continue
+
+        out = g.output
+        if isinstance(res, int):
+            res = _get_const(mod, res, out.width)
+        keep_name = out.is_output or out.is_reg or len(drivers[out.name]) != 1
+        if keep_name or res.width != out.width:
+            # The output signal has to stay driven: reduce the gate to a buffer
+            if g.op_type != "BUF" or g.inputs[0] is not res:
+                folded += 1
+            new_gates.append(Gate("BUF", [res], out))
+        else:
+            alias[out.name] = res
+            folded += 1
+
+    # Readers that were visited before their driver (only possible on
+    # combinational loops) still need the substitution
+    drivers = {}
+    for g in new_gates:
+        g.inputs = [resolve(s) for s in g.inputs]
+        drivers.setdefault(g.output.name, []).append(g)
+
+    # 2) Live sweep: reverse BFS from output ports and registers
+
+    live = set()
+    stack = [s.name for s in mod.signals.values() if s.is_output or s.is_reg]
+    seen = set(stack)
+    while stack:
+        for g in drivers.get(stack.pop(), ()):
+            if id(g) in live:
+                continue
+            live.add(id(g))
+            for s in g.inputs:
+                if s.name not in seen:
+                    seen.add(s.name)
+                    stack.append(s.name)
+
+    kept = [g for g in new_gates if id(g) in live]
+    print(f"  > Folded {folded} gates, removed {len(new_gates) - len(kept)} dead gates "
+          f"({len(gates)} -> {len(kept)})")
+    mod.gates = kept